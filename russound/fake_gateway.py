@@ -0,0 +1,208 @@
+""" Checks for timing sensitive behaviour against a fake RNET gateway on localhost, so no hardware is needed.
+Run with python fake_gateway.py from this directory, it exits with a non zero status if any check fails. """
+
+import asyncio
+import queue
+import socket
+import sys
+import threading
+import time
+import russound
+
+
+class FakeGateway:
+    """ Accepts connections on a free localhost port and answers zone info queries with a status frame.
+    Replies are sent in order, as a serial gateway would, each one no earlier than its delay after its query.
+    The volume reported for a zone is the last one set with set_volume, or if none has been set, the number of
+    queries answered so far on the connection (so that replies to successive queries can be told apart). """
+
+    def __init__(self, delays=(), delay=0.0, drop_after=None):
+        """ delays are the reply delays for the first queries on each connection, delay is used for the rest.
+        If drop_after is given, each connection is closed by the gateway once it has sent that many replies. """
+
+        self._delays = delays
+        self._delay = delay
+        self._drop_after = drop_after
+        self._volumes = {}
+        self._server = socket.socket()
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(5)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self.__accept, daemon=True).start()
+
+    def close(self):
+        self._server.close()
+
+    def __accept(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.__handle, args=(connection,), daemon=True).start()
+
+    def __handle(self, connection):
+        replies = queue.Queue()
+        threading.Thread(target=self.__send_replies, args=(connection, replies), daemon=True).start()
+        data = b''
+        queries = 0
+        while True:
+            try:
+                received = connection.recv(4096)
+            except OSError:
+                return
+            if not received:
+                return
+            data += received
+            while b'\xf7' in data:
+                end = data.index(b'\xf7') + 1
+                frame, data = data[:end], data[end:]
+                if frame[7] == 0x01:  # zone_info query
+                    queries += 1
+                    delay = self._delays[queries - 1] if queries <= len(self._delays) else self._delay
+                    replies.put((time.monotonic() + delay, self.__zone_info(frame[1], frame[11], queries)))
+                elif frame[13] == 0x21:  # set_volume
+                    self._volumes[frame[17]] = frame[15]
+
+    def __zone_info(self, controller, zone, queries):
+        reply = bytearray([0xF0, controller, 0x00, 0x70, 0x00, 0x00, 0x7F, 0x00, 0x00, 0x04, 0x02, 0x00, zone, 0x07,
+                           0x00, 0x00, 0x01, 0x00, 0x0C, 0x00, 0x01, 0x00, self._volumes.get(zone, queries)])
+        reply += bytes(9)
+        russound._checksum(reply)
+        return bytes(reply)
+
+    def __send_replies(self, connection, replies):
+        sent = 0
+        while True:
+            due, reply = replies.get()
+            time.sleep(max(due - time.monotonic(), 0))
+            try:
+                connection.sendall(reply)
+            except OSError:
+                return
+            sent += 1
+            if sent == self._drop_after:
+                connection.shutdown(socket.SHUT_RDWR)
+                connection.close()
+                return
+
+
+def check_late_reply():
+    """ A reply that arrives after its query timed out mustn't be taken as the answer to the next query """
+
+    gateway = FakeGateway(delays=(russound.RESPONSE_TIMEOUT + 0.2,))
+    x = russound.Russound('127.0.0.1', gateway.port)
+    x.connect()
+    first = x.get_zone_info(1, 1, 2)
+    time.sleep(0.5)  # The late reply arrives before the next query is sent
+    results = (first, x.get_zone_info(1, 1, 2), x.get_zone_info(1, 1, 2))
+    x.close()
+    gateway.close()
+    return results == (None, 2, 3), results
+
+
+def check_late_reply_async():
+    """ As check_late_reply, for AsyncRussound """
+
+    async def run():
+        gateway = FakeGateway(delays=(russound.RESPONSE_TIMEOUT + 0.2,))
+        async with russound.AsyncRussound('127.0.0.1', gateway.port) as x:
+            first = await x.get_zone_info(1, 1, 2)
+            await asyncio.sleep(0.5)
+            results = (first, await x.get_zone_info(1, 1, 2), await x.get_zone_info(1, 1, 2))
+        gateway.close()
+        return results
+
+    results = asyncio.run(run())
+    return results == (None, 2, 3), results
+
+
+def check_cache_race():
+    """ A setter called while a cached read is in flight mustn't leave the value from before the change cached """
+
+    gateway = FakeGateway(delay=0.3)
+    x = russound.Russound('127.0.0.1', gateway.port, cache_ttl=30)
+    x.connect()
+    reader = threading.Thread(target=x.get_volume, args=(1, 1))
+    reader.start()
+    time.sleep(0.05)  # The read's query is now waiting for its reply
+    x.set_volume(1, 1, 60)
+    reader.join()
+    volume = x.get_volume(1, 1)
+    x.close()
+    gateway.close()
+    return volume == 60, volume
+
+
+def check_cache_race_async():
+    """ As check_cache_race, for AsyncRussound """
+
+    async def run():
+        gateway = FakeGateway(delay=0.3)
+        async with russound.AsyncRussound('127.0.0.1', gateway.port, cache_ttl=30) as x:
+            reader = asyncio.ensure_future(x.get_volume(1, 1))
+            await asyncio.sleep(0.05)
+            await x.set_volume(1, 1, 60)
+            await reader
+            volume = await x.get_volume(1, 1)
+        gateway.close()
+        return volume
+
+    volume = asyncio.run(run())
+    return volume == 60, volume
+
+
+def check_gateway_drop():
+    """ When the gateway closes the connection, the next command reconnects and succeeds """
+
+    gateway = FakeGateway(drop_after=1)
+    x = russound.Russound('127.0.0.1', gateway.port)
+    x.connect()
+    results = (x.get_zone_info(1, 1, 2), x.get_zone_info(1, 1, 2), x.is_connected())
+    x.close()
+    gateway.close()
+    return results == (1, 1, True), results
+
+
+def check_gateway_drop_async():
+    """ When the gateway closes the connection, AsyncRussound notices: is_connected reports it and commands raise
+    ConnectionError until connect is called again """
+
+    async def run():
+        gateway = FakeGateway(drop_after=1)
+        x = russound.AsyncRussound('127.0.0.1', gateway.port)
+        await x.connect()
+        results = [await x.get_zone_info(1, 1, 2)]
+        await asyncio.sleep(0.1)  # Let the gateway's close arrive
+        results.append(await x.get_zone_info(1, 1, 2))
+        results.append(x.is_connected())
+        try:
+            await x.get_zone_info(1, 1, 2)
+            results.append('no error')
+        except ConnectionError:
+            results.append('ConnectionError')
+        await x.connect()
+        results.append(await x.get_zone_info(1, 1, 2))
+        await x.close()
+        gateway.close()
+        return tuple(results)
+
+    results = asyncio.run(run())
+    return results == (1, None, False, 'ConnectionError', 1), results
+
+
+CHECKS = [check_late_reply, check_late_reply_async, check_cache_race, check_cache_race_async, check_gateway_drop,
+          check_gateway_drop_async]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        passed, detail = check()
+        print("%s %s: %s" % ('PASS' if passed else 'FAIL', check.__name__, detail))
+        failed += not passed
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
@@ -13,7 +13,10 @@ The Russound RNET protocol is documented in cav6.6_rnet_protocol_v1.01.00.pdf, a
 which are stored in the source code repo.
 """
 
+import asyncio
+import functools
 import logging
+import selectors
 import time
 import socket
 import threading
@@ -22,8 +25,224 @@ _LOGGER = logging.getLogger(__name__)
 # Recommendation is that this should be at leat 100ms delay to ensure subsequent commands
 # are processed correctly (pg 35 on russound-rs-232-V01_00_01.pdf).
 COMMAND_DELAY = 0.1
+RESPONSE_TIMEOUT = 1.0  # Seconds to wait for the response to a query, it is returned as soon as it arrives
+SOCKET_TIMEOUT = 5  # Seconds to wait when connecting to, or sending to, the gateway before giving up
+RECONNECT_DELAY = 1  # Seconds to wait after a failed reconnect before trying again, doubling up to RECONNECT_MAX_DELAY
+RECONNECT_MAX_DELAY = 60
+# TCP keepalive, so that a gateway which has dropped off the network is noticed within about a minute even while idle:
+# probe after KEEPALIVE_IDLE seconds without traffic, every KEEPALIVE_INTERVAL seconds, giving up after KEEPALIVE_COUNT
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
 KEYPAD_CODE = '70'  # For an external system this is the required value (pg 28 of cav6.6_rnet_protocol_v1.01.00.pdf)
 
+# RNET command message templates (excluding the checksum and end of message bytes). @cc, @zz and @pr mark the
+# controller, zone and parameter bytes which are set per call, @kk is replaced by KEYPAD_CODE. The templates are
+# compiled once at import (see _compile_template) so building a message is a copy plus a few byte stores.
+_TEMPLATE_STRINGS = {
+    'set_power': "F0 @cc 00 7F 00 00 @kk 05 02 02 00 00 F1 23 00 @pr 00 @zz 00 01",
+    'set_volume': "F0 @cc 00 7F 00 00 @kk 05 02 02 00 00 F1 21 00 @pr 00 @zz 00 01",
+    'set_source': "F0 @cc 00 7F 00 @zz @kk 05 02 00 00 00 F1 3E 00 00 00 @pr 00 01",
+    'all_on_off': "F0 7F 00 7F 00 00 @kk 05 02 02 00 00 F1 22 00 00 @pr 00 00 01",
+    'toggle_mute': "F0 @cc 00 7F 00 @zz @kk 05 02 02 00 00 F1 40 00 00 00 0D 00 01",
+    'zone_info': "F0 @cc 00 7F 00 00 @kk 01 04 02 00 @zz 07 00 00",
+}
+
+
+def _compile_template(string_message):
+    """ Decode a message template once into immutable bytes (with the placeholders as 00) and the offsets of the
+    controller, zone and parameter bytes (None where the template has no such placeholder) """
+
+    tokens = string_message.replace('@kk', KEYPAD_CODE).split()
+    offsets = {}
+    for i, token in enumerate(tokens):
+        if token.startswith('@'):
+            offsets[token] = i
+            tokens[i] = '00'
+    return bytes.fromhex(''.join(tokens)), offsets.get('@cc'), offsets.get('@zz'), offsets.get('@pr')
+
+
+_TEMPLATES = {name: _compile_template(string_message) for name, string_message in _TEMPLATE_STRINGS.items()}
+
+# Signatures identifying the response to a query within the received stream, compiled the same way as the templates.
+# Expected response is as per pg 23 of cav6.6_rnet_protocol_v1.01.00.pdf
+_SIGNATURES = {
+    'zone_info': _compile_template("04 02 00 @zz 07"),
+}
+# The payload of a response ends 13 bytes after the start of its signature (see _zone_info_value), so a message that
+# ends sooner, such as a zone info query that contains the same bytes, can't be the response
+_MIN_RESPONSE_LENGTH = 14
+
+
+def _set_socket_options(sock):
+    """ Tune a newly connected gateway socket """
+
+    # Commands are small frames that are immediately followed by a read, so don't let Nagle delay them
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    # Long lived control connection, so detect a dead gateway with keepalives (the timings aren't settable everywhere)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+
+
+def _checksum(data):
+    """ Append the RNET checksum, followed by the end of message byte, to a command frame.
+    The checksum is the sum of all bytes in the frame plus the frame length, limited to 7 bits. """
+
+    data.append((sum(data) + len(data)) & 0x7F)
+    data.append(0xF7)
+
+
+@functools.lru_cache(maxsize=256)
+def _create_send_message(name, controller=None, zone=None, parameter=None):
+    """ Creates a message from a precompiled template, setting the necessary parameters,
+    that is ready to send to the socket. The same few frames are sent over and over (a poll of each zone, a handful of
+    volume levels), so finished frames are cached, and returned as bytes so they can be shared safely. """
+
+    template, cc_offset, zz_offset, pr_offset = _TEMPLATES[name]
+    send_msg = bytearray(template)
+    if cc_offset is not None:
+        send_msg[cc_offset] = int(controller) - 1  # RNET requires controller value to be zero based
+    if zz_offset is not None:
+        send_msg[zz_offset] = int(zone) - 1  # RNET requires zone value to be zero based
+    if pr_offset is not None:
+        send_msg[pr_offset] = int(parameter)
+    _checksum(send_msg)
+    return bytes(send_msg)
+
+
+@functools.lru_cache(maxsize=64)
+def _create_response_signature(name, zone):
+    """ Basic helper function to keep code clean for defining a response message signature. Returned as bytes so it
+    can be compared directly with the received stream and used as a dict key. As bytes are immutable the signature
+    for each zone is built once and then reused for every poll. """
+
+    template, _, zz_offset, _ = _SIGNATURES[name]
+    msg_signature = bytearray(template)
+    msg_signature[zz_offset] = int(zone) - 1  # RNET requires zone value to be zero based
+    return bytes(msg_signature)
+
+
+def _find_signature(data_stream, msg_signature):
+    """ Takes the stream of bytes received and looks for a message that matches the signature (bytes)
+    of the expected response. Returns the stream from the start of the matching message, or None """
+
+    # Search with find, which scans in C, rather than stepping through the stream a byte at a time
+    i = data_stream.find(msg_signature)
+    while i != -1:
+        # ensure ALL bytes of the response have been received by looking for the end of message byte after the
+        # signature (F7 can't occur within a message, values above 7F are escaped by F1)
+        end = data_stream.find(247, i + len(msg_signature))
+        if end == -1:
+            return None
+        if end >= i + _MIN_RESPONSE_LENGTH:
+            _LOGGER.debug("Message signature found at location: %s", i)
+            return data_stream[i:]
+        # Too short to be the response, keep looking after the end of this message
+        i = data_stream.find(msg_signature, end)
+    return None
+
+
+def _find_signatures(data_stream, msg_signatures):
+    """ Looks for the responses to several queries at once. Returns a dict mapping each signature found to its
+    matching message, and the stream with the bytes that no longer need searching removed """
+
+    matching_messages = {}
+    for msg_signature in msg_signatures:
+        matching_message = _find_signature(data_stream, msg_signature)
+        if matching_message is not None:
+            matching_messages[msg_signature] = matching_message
+    # Every complete message has now been checked against every signature, so scrap bytes up to the end of the last one
+    index_of_last_f7 = data_stream.rfind(247)
+    if index_of_last_f7 != -1:
+        data_stream = data_stream[index_of_last_f7:]
+    return matching_messages, data_stream
+
+
+def _zone_status(zone_info):
+    """ Convert a zone info list into a dict of power, source and volume (0..100), or None if not received """
+
+    if zone_info is None:
+        return None
+    return {'power': zone_info[0], 'source': zone_info[1], 'volume': zone_info[2] * 2}
+
+
+def _zone_info_value(matching_message, return_variable):
+    """ Extract the requested value(s) from a zone info response stream, see Russound.get_zone_info """
+
+    if matching_message is None:
+        return None
+    # Offset of 11 is the position of return data payload is that we require for the signature we are using.
+    _LOGGER.debug("matching message to use= %s, length= %s", matching_message, len(matching_message))
+    if return_variable == 4:
+        return [matching_message[11], matching_message[12], matching_message[13]]
+    return matching_message[return_variable + 11]
+
+
+class _ZoneCache:
+    """ Remembers the power, source and volume last read for each zone for ttl seconds, so repeated polls within that
+    time are answered without a round trip to the controller. A ttl of 0 disables the cache. """
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._zones = {}  # (controller, zone) -> (time.monotonic() when read, [power, source, volume])
+
+    def get(self, controller, zone):
+        """ Returns the cached zone info list, or None if there is none or it has expired """
+
+        if not self._ttl:
+            return None
+        cached = self._zones.get((int(controller), int(zone)))
+        if cached is None or time.monotonic() - cached[0] >= self._ttl:
+            return None
+        return list(cached[1])
+
+    def put(self, controller, zone, zone_info):
+        """ Remember the zone info list just read for a zone, unless caching is disabled """
+
+        if self._ttl and zone_info is not None:
+            self._zones[(int(controller), int(zone))] = (time.monotonic(), list(zone_info))
+
+    def invalidate(self, controller=None, zone=None):
+        """ Forget a zone after it has been changed, or every zone if no controller is given """
+
+        if controller is None:
+            self._zones.clear()
+        else:
+            self._zones.pop((int(controller), int(zone)), None)
+
+
+def _zone_info_response(zone_cache, controller, zone, matching_message):
+    """ Decode a zone info response into [power, source, volume] and remember it in zone_cache, or log a warning and
+    return None if the response wasn't received """
+
+    zone_info = _zone_info_value(matching_message, 4)
+    if zone_info is None:
+        _LOGGER.warning("Did not receive expected Russound zone status for controller %s and zone %s.",
+                        controller, zone)
+    else:
+        zone_cache.put(controller, zone, zone_info)
+    return zone_info
+
+
+def _select_zone_info(zone_info, return_variable):
+    """ Pick the value(s) requested by return_variable out of a zone info list, see Russound.get_zone_info """
+
+    if zone_info is None or return_variable == 4:
+        return zone_info
+    return zone_info[return_variable]
+
+
+def _all_status(zone_cache, controller, resp_msg_signatures, matching_messages):
+    """ Build the result of get_all_status from the responses found, given the signature expected for each zone """
+
+    return {zone: _zone_status(_zone_info_response(zone_cache, controller, zone, matching_messages.get(sig)))
+            for zone, sig in resp_msg_signatures.items()}
+
 
 class Russound:
     """ Implements a python API for selected commands to the Russound system using the RNET protocol.
@@ -32,14 +251,31 @@ class Russound:
 
     _sem_comm = 0
 
-    def __init__(self, host, port):
-        """ Initialise Russound class """
+    def __init__(self, host, port, timeout=SOCKET_TIMEOUT, cache_ttl=0):
+        """ Initialise Russound class
+        :param cache_ttl: Seconds for which zone power, source and volume reads are cached (0, the default, disables
+        caching). Changes made through this instance clear the cached values for the zone.
+        """
 
         self._host = host
         self._port = int(port)
+        self._timeout = timeout
+        self._zone_cache = _ZoneCache(cache_ttl)
         self.sock = None
-        self._last_send = time.time()  # Use this to keep track of when the last send command was sent
+        self._next_send = 0.0  # time.monotonic() from which the next command may be sent, see COMMAND_DELAY
         self.lock = threading.Lock()   # Used to ensure only one thread sends commands to the Russound
+        self._pending_response = False  # Set when a command was sent without reading the reply
+        self._connected = False  # Updated on connect, disconnect and socket errors, see is_connected
+        self._auto_reconnect = False  # Set by connect, cleared on disconnect, see __reconnect
+        self._reconnect_delay = RECONNECT_DELAY
+        self._next_reconnect = 0.0  # time.monotonic() before which a lost connection isn't reopened
+        # Scratch buffer that every socket read is received into, rather than allocating a new bytes object per read
+        self._recv_buffer = bytearray(4096)
+        self._recv_view = memoryview(self._recv_buffer)
+        # Waits for the socket to become readable. Unlike select.select it isn't limited to file descriptors below
+        # FD_SETSIZE, and the socket is registered once per connection rather than passed in on every wait. Created on
+        # connect and released by close.
+        self._selector = None
 
     def connect(self):
         """ Connect to the tcp gateway
@@ -48,33 +284,87 @@ class Russound:
         device controlling the system (top of pg 3 of cav6.6_rnet_protocol_v1.01.00.pdf). (In fact I don't know under
         what circumstances we would actually want to pass a keypadID at all).
         Each call to connect will create a new socket and use it to connect. This allows recovery from a broken socket.
+        Once connect has been called, a connection that is lost is also reopened automatically by the next command.
         """
 
         with self.lock:
-            try:
-                if self.sock is not None:
-                    try:
-                        self.sock.close()
-                    except socket.error:
-                        pass
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.connect((self._host, self._port))
-                _LOGGER.info("Successfully connected to Russound on %s:%s", self._host, self._port)
-                return True
-            except socket.error as msg:
-                self.sock = None
-                _LOGGER.error("Error trying to connect to Russound controller.")
-                _LOGGER.error(msg)
-                return False
+            self._auto_reconnect = True
+            return self.__open()
 
-    def is_connected(self):
-        """ Check we are connected """
+    def __open(self):
+        """ Replace the socket with a new connection to the gateway, the caller must hold the lock """
 
-        try:  # Will throw an exception if sock is not connected hence the try catch.
-            return self.sock and self.sock.getpeername() != ''
-        except:
+        if self.sock is not None:
+            self.__close_socket()
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+        try:
+            # create_connection resolves the host (including IPv6) and won't hang if the gateway is offline
+            self.sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+            _set_socket_options(self.sock)
+            self._selector.register(self.sock, selectors.EVENT_READ)
+            self._pending_response = False
+            self._connected = True
+            self._reconnect_delay = RECONNECT_DELAY
+            _LOGGER.info("Successfully connected to Russound on %s:%s", self._host, self._port)
+            return True
+        except socket.error as msg:
+            if self.sock is not None:  # Connected, but setting it up failed
+                self.__close_socket()
+            self._connected = False
+            _LOGGER.error("Error trying to connect to Russound controller.")
+            _LOGGER.error(msg)
             return False
 
+    def __close_socket(self):
+        """ Close the socket, removing it from the selector first """
+
+        self._connected = False
+        try:
+            self._selector.unregister(self.sock)
+        except (KeyError, ValueError):  # Not registered, or already closed
+            pass
+        try:
+            self.sock.close()
+        except socket.error as msg:
+            _LOGGER.error("Couldn't disconnect")
+            _LOGGER.error(msg)
+        self.sock = None
+
+    def close(self):
+        """ Close connection to gateway, and stop commands from reconnecting. connect can be called again later. """
+
+        with self.lock:
+            self._auto_reconnect = False
+            if self.sock is not None:
+                self.__close_socket()
+                _LOGGER.info("Closed connection to Russound on %s:%s", self._host, self._port)
+            if self._selector is not None:
+                self._selector.close()
+                self._selector = None
+
+    def __reconnect(self):
+        """ Reopen a lost connection, the caller must hold the lock. Raises ConnectionError if it can't be reopened.
+        After a failed attempt further attempts are held off for an exponentially increasing delay, so that polling a
+        gateway which is down doesn't try to connect on every command. """
+
+        if not self._auto_reconnect:
+            raise ConnectionError("Not connected to Russound controller on %s:%s" % (self._host, self._port))
+        if time.monotonic() < self._next_reconnect:
+            raise ConnectionError("Lost connection to Russound controller on %s:%s, waiting to reconnect"
+                                  % (self._host, self._port))
+        _LOGGER.warning("Reconnecting to Russound on %s:%s", self._host, self._port)
+        if not self.__open():
+            self._next_reconnect = time.monotonic() + self._reconnect_delay
+            self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX_DELAY)
+            raise ConnectionError("Couldn't reconnect to Russound controller on %s:%s" % (self._host, self._port))
+
+    def is_connected(self):
+        """ Check we are connected. This is tracked from connect, disconnect and socket errors rather than
+        querying the socket, so it is cheap enough to call on every poll. """
+
+        return self._connected
+
     def set_power(self, controller, zone, power):
         """ Switch power on/off to a zone
         :param controller: Russound Controller ID. For systems with one controller this should be a value of 1.
@@ -83,12 +373,10 @@ class Russound:
         """
 
         _LOGGER.debug("Begin - controller= %s, zone= %s, change power to %s",controller, zone, power)
-        send_msg = self.__create_send_message("F0 @cc 00 7F 00 00 @kk 05 02 02 00 00 F1 23 00 @pr 00 @zz 00 01", controller, zone, power)
+        send_msg = _create_send_message('set_power', controller, zone, power)
         with self.lock:
-            _LOGGER.debug('Zone %s - acquired lock', zone)
-            self.__send_data(send_msg)
-            _LOGGER.debug("Zone %s - sent message %s", zone, send_msg)
-            self.__get_response_message()  # Clear response buffer
+            self.__query(send_msg)  # No response is needed, any reply is discarded before the next command
+            self._zone_cache.invalidate(controller, zone)
         _LOGGER.debug("End - controller %s, zone %s, power set to %s.\n", controller, zone, power)
 
     def set_volume(self, controller, zone, volume):
@@ -98,27 +386,20 @@ class Russound:
         """
 
         _LOGGER.debug("Begin - controller= %s, zone= %s, change volume to %s",controller, zone, volume)
-        send_msg = self.__create_send_message("F0 @cc 00 7F 00 00 @kk 05 02 02 00 00 F1 21 00 @pr 00 @zz 00 01",
-                                            controller, zone, volume // 2)
+        send_msg = _create_send_message('set_volume', controller, zone, int(volume) // 2)
         with self.lock:
-            _LOGGER.debug('Zone %s - acquired lock', zone)
-            self.__send_data(send_msg)
-            _LOGGER.debug("Zone %s - sent message %s", zone, send_msg)
-            self.__get_response_message()  # Clear response buffer
+            self.__query(send_msg)  # No response is needed, any reply is discarded before the next command
+            self._zone_cache.invalidate(controller, zone)
         _LOGGER.debug("End - controller %s, zone %s, volume set to %s.\n", controller, zone, volume)
 
     def set_source(self, controller, zone, source):
         """ Set source for a zone - 0 based value for source """
 
-        _LOGGER.info("Begin - controller= %s, zone= %s change source to %s.", controller, zone, source)
-        send_msg = self.__create_send_message("F0 @cc 00 7F 00 @zz @kk 05 02 00 00 00 F1 3E 00 00 00 @pr 00 01",
-                                            controller, zone, source)
+        _LOGGER.debug("Begin - controller= %s, zone= %s change source to %s.", controller, zone, source)
+        send_msg = _create_send_message('set_source', controller, zone, source)
         with self.lock:
-            _LOGGER.debug('Zone %s - acquired lock', zone)
-            self.__send_data(send_msg)
-            _LOGGER.debug("Zone %s - sent message %s", zone, send_msg)
-            # Clear response buffer in case there is any response data(ensures correct results on future reads)
-            self.__get_response_message()
+            self.__query(send_msg)  # No response is needed, any reply is discarded before the next command
+            self._zone_cache.invalidate(controller, zone)
         _LOGGER.debug("End - controller= %s, zone= %s source set to %s.\n", controller, zone, source)
 
     def all_on_off(self, power):
@@ -128,20 +409,19 @@ class Russound:
         Note: Not tested (acambitsis)
         """
 
-        send_msg = self.__create_send_message("F0 7F 00 7F 00 00 @kk 05 02 02 00 00 F1 22 00 00 @pr 00 00 01", None, None, power)
+        send_msg = _create_send_message('all_on_off', parameter=power)
         with self.lock:
-            self.__send_data(send_msg)
-            self.__get_response_message()  # Clear response buffer
+            self.__query(send_msg)  # No response is needed, any reply is discarded before the next command
+            self._zone_cache.invalidate()
 
     def toggle_mute(self, controller, zone):
         """ Toggle mute on/off for a zone
         Note: Not tested (acambitsis) """
 
-        send_msg = self.__create_send_message("F0 @cc 00 7F 00 @zz @kk 05 02 02 00 00 F1 40 00 00 00 0D 00 01", controller, zone)
-
+        send_msg = _create_send_message('toggle_mute', controller, zone)
         with self.lock:
-            self.__send_data(send_msg)
-            self.__get_response_message()  # Clear response buffer
+            self.__query(send_msg)  # No response is needed, any reply is discarded before the next command
+            self._zone_cache.invalidate(controller, zone)
 
     def get_zone_info(self, controller, zone, return_variable):
         """ Get all relevant info for the zone
@@ -154,28 +434,19 @@ class Russound:
         # resp_msg_signature = self.create_response_signature("04 02 00 @zz 07 00 00 01 00 0C", zone)
 
         _LOGGER.debug("Begin - controller= %s, zone= %s, get status", controller, zone)
-        resp_msg_signature = self.__create_response_signature("04 02 00 @zz 07", zone)
-        send_msg = self.__create_send_message("F0 @cc 00 7F 00 00 @kk 01 04 02 00 @zz 07 00 00", controller, zone)
+        # The cache is read and filled under the lock, so a zone can't be cached from a response to a query that was
+        # sent before a change that has since cleared it
         with self.lock:
-            _LOGGER.debug('Acquired lock zone for zone %s', zone)
-            self.__send_data(send_msg)
-            _LOGGER.debug("Zone: %s Sent: %s", zone, send_msg)
-            # Expected response is as per pg 23 of cav6.6_rnet_protocol_v1.01.00.pdf
-            matching_message = self.__get_response_message(resp_msg_signature)
-            if matching_message is not None:
-                # Offset of 11 is the position of return data payload is that we require for the signature we are using.
-                _LOGGER.debug("matching message to use= %s", matching_message)
-                _LOGGER.debug("matching message length= %s", len(matching_message))
-                if return_variable == 4:
-                    return_value = [matching_message[11], matching_message[12], matching_message[13]]
-                else:
-                    return_value = matching_message[return_variable + 11]
-            else:
-                return_value = None
-                _LOGGER.warning("Did not receive expected Russound power state for controller %s and zone %s.", controller, zone)
-        
+            zone_info = self._zone_cache.get(controller, zone)
+            if zone_info is None:
+                resp_msg_signature = _create_response_signature('zone_info', zone)
+                send_msg = _create_send_message('zone_info', controller, zone)
+                # Expected response is as per pg 23 of cav6.6_rnet_protocol_v1.01.00.pdf
+                matching_message = self.__query(send_msg, resp_msg_signature)
+                zone_info = _zone_info_response(self._zone_cache, controller, zone, matching_message)
+
         _LOGGER.debug("End - controller= %s, zone= %s, get status \n", controller, zone)
-        return return_value
+        return _select_zone_info(zone_info, return_variable)
 
     def get_power(self, controller, zone):
         """ Gets the power status as a 0 or 1 which is located on a 0 byte offset """
@@ -193,142 +464,409 @@ class Russound:
             volume_level *= 2
         return volume_level
 
-    def __create_send_message(self, string_message, controller, zone=None, parameter=None):
-        """ Creates a message from a string, substituting the necessary parameters,
-        that is ready to send to the socket """
-
-        cc = hex(int(controller) - 1).replace('0x', '')  # RNET requires controller value to be zero based
-        if zone is not None:
-            zz = hex(int(zone) - 1).replace('0x', '')  # RNET requires zone value to be zero based
-        else:
-            zz = ''
-        if parameter is not None:
-            pr = hex(int(parameter)).replace('0x', '')
-        else:
-            pr = ''
+    def get_zone_state(self, controller, zone):
+        """ Get the power, source and volume of a zone from a single query (rather than calling get_power, get_source
+        and get_volume, which each send their own query unless cache_ttl is set).
+        Returns {'power': .., 'source': .., 'volume': 0..100}, or None if the response wasn't received """
 
-        string_message = string_message.replace('@cc', cc)  # Replace controller parameter
-        string_message = string_message.replace('@zz', zz)  # Replace zone parameter
-        string_message = string_message.replace('@kk', KEYPAD_CODE)  # Replace keypad parameter
-        string_message = string_message.replace('@pr', pr)  # Replace specific parameter to message
+        return _zone_status(self.get_zone_info(controller, zone, 4))
 
-        # Split message into an array for each "byte" and add the checksum and end of message bytes
-        send_msg = string_message.split()
-        send_msg = self.__calc_checksum(send_msg)
-        return send_msg
+    def get_all_status(self, controller, zones):
+        """ Get the power, source and volume of several zones in one pass.
+        The queries are sent back to back (still spaced by COMMAND_DELAY) and all of the responses are then collected
+        in a single read, rather than waiting for each response before sending the next query.
+        Returns a dict keyed by zone of {'power': .., 'source': .., 'volume': 0..100}, or None for a zone whose
+        response wasn't received """
 
-    def __create_response_signature(self, string_message, zone):
-        """ Basic helper function to keep code clean for defining a response message signature """
-
-        zz = ''
-        if zone is not None:
-            zz = hex(int(zone)-1).replace('0x', '')  # RNET requires zone value to be zero based
-        string_message = string_message.replace('@zz', zz)  # Replace zone parameter
-        return string_message
+        zones = list(zones)  # Used more than once, so don't let an iterator be used up by the first pass
+        _LOGGER.debug("Begin - controller= %s, zones= %s, get status", controller, zones)
+        resp_msg_signatures = {zone: _create_response_signature('zone_info', zone) for zone in zones}
+        with self.lock:
+            for zone in zones:
+                self.__send_data(_create_send_message('zone_info', controller, zone))
+            matching_messages = self.__get_response_messages(set(resp_msg_signatures.values()),
+                                                             RESPONSE_TIMEOUT + COMMAND_DELAY * len(zones))
+            return _all_status(self._zone_cache, controller, resp_msg_signatures, matching_messages)
+
+    def __query(self, send_msg, resp_msg_signature=None, timeout=RESPONSE_TIMEOUT):
+        """ Single round trip to the gateway: send a command frame and wait up to timeout for the response.
+        Returns the stream starting at the response signature, or None if no signature was given or it wasn't found.
+        When no signature is given the reply isn't waited for. The caller must hold the lock. """
+
+        _LOGGER.debug('Acquired lock, sending message %s', send_msg)
+        self.__send_data(send_msg)
+        if resp_msg_signature is None:
+            # Don't wait for a reply we don't need, it is cleared at the start of the next command instead
+            self._pending_response = True
+            return None
+        matching_message = self.__get_response_messages((resp_msg_signature,), timeout).get(resp_msg_signature)
+        if matching_message is None and not self._connected:
+            # The connection was lost while waiting for the response, send the query again on a new one
+            self.__send_data(send_msg)
+            matching_message = self.__get_response_messages((resp_msg_signature,), timeout).get(resp_msg_signature)
+        return matching_message
 
     def __send_data(self, data, delay=COMMAND_DELAY):
         """ Send data to connected gateway """
 
-        time_since_last_send = time.time() - self._last_send
-        delay = max(0, delay - time_since_last_send)
-        time.sleep(delay)  # Ensure minim recommended delay since last send
+        if self._connected and self._pending_response:
+            # Discard replies to earlier commands, including any that arrive while waiting for the delay below
+            self.__clear_response_buffer(self._next_send)
+        wait = self._next_send - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)  # Ensure minimum recommended delay since last send, only sleeping for what remains
 
-        for item in data:
-            data = bytes.fromhex(str(item.zfill(2)))
-            try:
-                self.sock.send(data)
-            except ConnectionResetError as msg:
-                _LOGGER.error("Error trying to connect to Russound controller. "
-                              "Check that no other device or system is using the port that "
-                              "you are trying to connect to. Try resetting the bridge you are using to connect.")
-                _LOGGER.error(msg)
-        self._last_send = time.time()
+        if not self._connected:
+            self.__reconnect()
 
-    def __get_response_message(self, resp_msg_signature=None, delay=COMMAND_DELAY):
-        """ Receive data from connected gateway and if required seach and return a stream that starts at the required
-        response message signature.  The reason we couple the search for the response signature here is that given the
+        try:
+            self.sock.sendall(data)  # Send the whole frame in a single call rather than byte by byte
+        except (ConnectionError, TimeoutError) as msg:  # Reset, broken pipe, or keepalive found the gateway gone
+            _LOGGER.error("Error trying to connect to Russound controller. "
+                          "Check that no other device or system is using the port that "
+                          "you are trying to connect to. Try resetting the bridge you are using to connect.")
+            _LOGGER.error(msg)
+            self._connected = False
+            self.__reconnect()
+            try:
+                self.sock.sendall(data)  # Retry once on the new connection, any further error is raised
+            except OSError:
+                self._connected = False
+                raise
+        except OSError:
+            self._connected = False
+            raise
+        self._next_send = time.monotonic() + delay
+
+    def __clear_response_buffer(self, deadline):
+        """ Discard whatever the gateway has sent in reply to earlier commands, reading until deadline (a
+        time.monotonic() value) but not waiting beyond it """
+
+        self._pending_response = False
+        try:
+            while self._selector.select(max(deadline - time.monotonic(), 0)):
+                if not self.sock.recv_into(self._recv_view):  # Connection closed by the gateway
+                    self._connected = False
+                    break
+        except (ConnectionError, TimeoutError):
+            self._connected = False
+
+    def __get_response_messages(self, resp_msg_signatures, timeout=RESPONSE_TIMEOUT):
+        """ Receive data from connected gateway and seach and return a dict mapping each of the required response
+        message signatures to the stream that starts at it (signatures not received within the timeout are omitted).
+        The reason we couple the search for the response signature here is that given the
         RNET protocol and TCP comms, we dont have an easy way of knowign that we have received the response.  We want to
         minimise the time spent reading the socket (to reduce user lag), hence we use the message response signature
         at this point to determine when to stop reading."""
 
-        matching_message = None  # Set intial value to none (assume no response found)
-        if resp_msg_signature is None:
-            no_of_socket_reads = 1  # If we are not looking for a specific response do a single read to clear the buffer
-        else:
-            no_of_socket_reads = 10 # Try 10x (= approx 1s at default)if we are looking for a specific response
-
-        time.sleep(delay)  # Insert recommended delay to ensure command is processed correctly
-        self.sock.setblocking(0)  # Needed to prevent request for waiting indefinitely
-
-        data = B''
-        for i in range(0, no_of_socket_reads):
+        matching_messages = {}  # Set intial value to empty (assume no response found)
+        pending = set(resp_msg_signatures)
+        # Wait in the selector until data arrives, for up to the timeout in total, rather than sleeping and polling a
+        # non-blocking socket. The socket stays blocking; recv only follows the selector reporting it readable.
+        deadline = time.monotonic() + timeout
+        data = bytearray()
+        i = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._selector.select(remaining):
+                break
             try:
                 # Receive what has been sent
-                data += self.sock.recv(4096)
-                _LOGGER.debug('i= %s; len= %s data= %s', i, len(data), '[{}]'.format(', '.join(hex(x) for x in data)))
-            except BlockingIOError:  # Expected outcome if there is not data
-                _LOGGER.debug('Passed=%s', i)
-                pass
-            except ConnectionResetError as msg:
+                received = self.sock.recv_into(self._recv_view)
+            except (ConnectionError, TimeoutError) as msg:  # The next command reconnects
+                self._connected = False
                 _LOGGER.error("Error trying to connect to Russound controller. Check that no other device or system "
                               "is using the port that you are trying to connect to. "
                               "Try resetting the bridge you are using to connect.")
                 _LOGGER.error(msg)
-            # Check if we have our message.  If so break out else keep looping.
-            if resp_msg_signature is not None:  # If we are looking for a specific response
-                matching_message, data = self.__find_signature(data, resp_msg_signature)
-            if matching_message is not None:  # Required response found
-                _LOGGER.debug("Number of reads=%s", i + 1)
                 break
-            time.sleep(delay)  # Wait before reading again - default of 100ms
-        return matching_message
-
-    def __find_signature(self, data_stream, msg_signature):
-        """ Takes the stream of bytes received and looks for a message that matches the signature
-        of the expected response """
-
-        signature_match_index = None  # The message that will be returned if it matches the signature
-        msg_signature = msg_signature.split()  # Split into list
-        # convert to bytearray in order to be able to compare with the messages list which contains bytearrays
-        msg_signature = bytearray(int(x, 16) for x in msg_signature)
-        # loop through each message returned from Russound
-        index_of_last_f7 = None
-        for i in range(len(data_stream)):
-            if data_stream[i] == 247:
-                index_of_last_f7 = i
-            # the below line checks for the matching signature, ensuring ALL bytes of the response have been received
-            if (data_stream[i:i + len(msg_signature)] == msg_signature) and (len(data_stream) - i >= 24):
-                signature_match_index = i
+            except OSError:
+                self._connected = False
+                raise
+            if not received:  # Connection closed by the gateway
+                self._connected = False
                 break
-        if signature_match_index is None:
-            # Scrap bytes up to end of msg (to avoid searching these again)
-            data_stream = data_stream[index_of_last_f7:len(data_stream)]
-            matching_message = None
-        else:
-            matching_message = data_stream[signature_match_index:len(data_stream)]
+            data += self._recv_view[:received]
+            i += 1
+            if _LOGGER.isEnabledFor(logging.DEBUG):  # Don't build the hex dump unless it will be logged
+                _LOGGER.debug('i= %s; len= %s data= %s', i, len(data), '[{}]'.format(', '.join(hex(x) for x in data)))
+            # Check if we have our messages.  If so break out else keep reading. A response is only complete once its
+            # end of message byte has arrived, so there is no point searching until a read includes one.
+            if self._recv_buffer.find(247, 0, received) != -1:
+                found, data = _find_signatures(data, pending)
+                matching_messages.update(found)
+                pending.difference_update(found)
+                if not pending:  # Required responses found
+                    _LOGGER.debug("Number of reads=%s", i)
+                    break
+        if pending:
+            # A response may still arrive after the timeout, so discard it before the next command rather than let it
+            # be taken as the response to a later query
+            self._pending_response = True
+        return matching_messages
+
+    def __enter__(self):
+        """ Connect to the gateway when used as a context manager """
+        self.connect()
+        return self
 
-        _LOGGER.debug("Message signature found at location: %s", signature_match_index)
-        return matching_message, data_stream
+    def __exit__(self, exception_type, exception_value, traceback):
+        """ Close connection to gateway """
+        self.close()
 
-    def __calc_checksum(self, data):
-        """ Calculate the checksum we need """
 
-        output = 0
-        length = len(data)
-        for value in data:
-            output += int(value, 16)
+class AsyncRussound:
+    """ asyncio version of the Russound class, using the same RNET frames.
+    Commands on one connection are still sent one at a time with COMMAND_DELAY between them, but waiting for the
+    gateway no longer blocks the event loop, so callers can await several zones (or several gateways) together. """
 
-        output += length
-        checksum = hex(output & int('0x007F', 16)).lstrip("0x")
-        data.append(checksum)
-        data.append('F7')
-        return data
+    def __init__(self, host, port, timeout=SOCKET_TIMEOUT, cache_ttl=0):
+        """ Initialise AsyncRussound class, see Russound.__init__ """
 
-    def __exit__(self, exception_type, exception_value, traceback):
+        self._host = host
+        self._port = int(port)
+        self._timeout = timeout
+        self._zone_cache = _ZoneCache(cache_ttl)
+        self._reader = None
+        self._writer = None
+        self._next_send = 0.0  # time.monotonic() from which the next command may be sent, see COMMAND_DELAY
+        self._lock = None  # asyncio.Lock ensuring only one task sends commands, and (re)connects, at a time, see __lock
+        self._pending_response = False  # Set when a reply may have been left in the stream, see Russound
+
+    async def connect(self):
+        """ Connect to the tcp gateway. Each call creates a new connection, allowing recovery from a broken one. """
+
+        async with self.__lock():
+            await self.__close()
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self._host, self._port), self._timeout)
+            except (OSError, asyncio.TimeoutError) as msg:
+                self._reader = self._writer = None
+                _LOGGER.error("Error trying to connect to Russound controller.")
+                _LOGGER.error(msg)
+                return False
+            _set_socket_options(self._writer.get_extra_info('socket'))
+            self._pending_response = False
+            _LOGGER.info("Successfully connected to Russound on %s:%s", self._host, self._port)
+            return True
+
+    def __lock(self):
+        """ The lock, created the first time a command or connect runs. Before Python 3.10 an asyncio.Lock belongs to
+        the event loop that is current when it is created, so it can't be created in __init__, which may run before
+        the loop that will use the connection (e.g. asyncio.run) has started. """
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def is_connected(self):
+        """ Check we are connected """
+
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def close(self):
         """ Close connection to gateway """
+
+        async with self.__lock():
+            await self.__close()
+
+    async def __close(self):
+        """ Close the connection, the caller must hold the lock """
+
+        if self._writer is None:
+            return
+        self._writer.close()
         try:
-            self.sock.close()
-            _LOGGER.info("Closed connection to Russound on %s:%s", self._host, self._port)
-        except socket.error as msg:
+            await self._writer.wait_closed()
+        except OSError as msg:
             _LOGGER.error("Couldn't disconnect")
             _LOGGER.error(msg)
+        self._reader = self._writer = None
+        _LOGGER.info("Closed connection to Russound on %s:%s", self._host, self._port)
+
+    async def __aenter__(self):
+        """ Connect to the gateway when used as an async context manager """
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        """ Close connection to gateway """
+        await self.close()
+
+    async def set_power(self, controller, zone, power):
+        """ Switch power on/off to a zone, see Russound.set_power """
+
+        async with self.__lock():
+            await self.__query(_create_send_message('set_power', controller, zone, power))
+            self._zone_cache.invalidate(controller, zone)
+
+    async def set_volume(self, controller, zone, volume):
+        """ Set volume (0..100) for zone, see Russound.set_volume """
+
+        async with self.__lock():
+            await self.__query(_create_send_message('set_volume', controller, zone, int(volume) // 2))
+            self._zone_cache.invalidate(controller, zone)
+
+    async def set_source(self, controller, zone, source):
+        """ Set source for a zone - 0 based value for source """
+
+        async with self.__lock():
+            await self.__query(_create_send_message('set_source', controller, zone, source))
+            self._zone_cache.invalidate(controller, zone)
+
+    async def all_on_off(self, power):
+        """ Turn all zones on or off, see Russound.all_on_off """
+
+        async with self.__lock():
+            await self.__query(_create_send_message('all_on_off', parameter=power))
+            self._zone_cache.invalidate()
+
+    async def toggle_mute(self, controller, zone):
+        """ Toggle mute on/off for a zone """
+
+        async with self.__lock():
+            await self.__query(_create_send_message('toggle_mute', controller, zone))
+            self._zone_cache.invalidate(controller, zone)
+
+    async def get_zone_info(self, controller, zone, return_variable):
+        """ Get all relevant info for the zone, see Russound.get_zone_info """
+
+        async with self.__lock():  # The cache is read and filled under the lock, as in Russound.get_zone_info
+            zone_info = self._zone_cache.get(controller, zone)
+            if zone_info is None:
+                resp_msg_signature = _create_response_signature('zone_info', zone)
+                send_msg = _create_send_message('zone_info', controller, zone)
+                matching_message = await self.__query(send_msg, resp_msg_signature)
+                zone_info = _zone_info_response(self._zone_cache, controller, zone, matching_message)
+        return _select_zone_info(zone_info, return_variable)
+
+    async def get_power(self, controller, zone):
+        """ Gets the power status as a 0 or 1 """
+        return await self.get_zone_info(controller, zone, 0)
+
+    async def get_source(self, controller, zone):
+        """ Gets the selected source as a 0 based index """
+        return await self.get_zone_info(controller, zone, 1)
+
+    async def get_volume(self, controller, zone):
+        """ Gets the volume level in the range of 0..100 """
+        volume_level = await self.get_zone_info(controller, zone, 2)
+        if volume_level is not None:
+            volume_level *= 2
+        return volume_level
+
+    async def get_zone_state(self, controller, zone):
+        """ Get the power, source and volume of a zone from a single query, see Russound.get_zone_state """
+        return _zone_status(await self.get_zone_info(controller, zone, 4))
+
+    async def get_all_status(self, controller, zones):
+        """ Get the power, source and volume of several zones in one pass, see Russound.get_all_status """
+
+        zones = list(zones)
+        resp_msg_signatures = {zone: _create_response_signature('zone_info', zone) for zone in zones}
+        async with self.__lock():
+            for zone in zones:
+                await self.__send_data(_create_send_message('zone_info', controller, zone))
+            matching_messages = await self.__get_response_messages(set(resp_msg_signatures.values()),
+                                                                   RESPONSE_TIMEOUT + COMMAND_DELAY * len(zones))
+            return _all_status(self._zone_cache, controller, resp_msg_signatures, matching_messages)
+
+    async def __query(self, send_msg, resp_msg_signature=None, timeout=RESPONSE_TIMEOUT):
+        """ Single round trip to the gateway: send a command frame and read the response. The caller must hold the
+        lock. """
+
+        await self.__send_data(send_msg)
+        if resp_msg_signature is None:
+            # Don't wait for a reply we don't need, it is cleared at the start of the next command instead
+            self._pending_response = True
+            return None
+        matching_messages = await self.__get_response_messages((resp_msg_signature,), timeout)
+        return matching_messages.get(resp_msg_signature)
+
+    async def __send_data(self, data):
+        """ Send data to connected gateway, once the minimum recommended delay since the last send has passed """
+
+        if self._writer is not None and self._pending_response:
+            # Discard replies to earlier commands, including any that arrive while waiting for the delay below
+            await self.__clear_response_buffer(self._next_send)
+        if self._writer is None:  # Never connected, closed, or found to be lost by a read
+            raise ConnectionError("Not connected to Russound controller on %s:%s" % (self._host, self._port))
+        wait = self._next_send - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+        except OSError as msg:
+            self.__connection_lost(msg)
+            raise ConnectionError("Lost connection to Russound controller on %s:%s" % (self._host, self._port))
+        self._next_send = time.monotonic() + COMMAND_DELAY
+
+    def __connection_lost(self, msg):
+        """ Drop a connection that the gateway has closed or that has failed, so that is_connected reports it and
+        commands raise ConnectionError until connect is called again. The caller must hold the lock. """
+
+        _LOGGER.error("Lost connection to Russound controller on %s:%s. Check that no other device or system is using "
+                      "the port, or try resetting the bridge you are using to connect.", self._host, self._port)
+        _LOGGER.error(msg)
+        self._writer.close()
+        self._reader = self._writer = None
+
+    async def __clear_response_buffer(self, deadline):
+        """ Discard whatever the gateway has sent in reply to earlier commands, reading until deadline, see
+        Russound.__clear_response_buffer """
+
+        self._pending_response = False
+        while True:
+            # Data already in the stream is returned without waiting, but allow a few ms past the deadline for the
+            # read to be scheduled and for anything the socket has received to reach the stream
+            remaining = max(deadline - time.monotonic(), 0.005)
+            try:
+                data = await asyncio.wait_for(self._reader.read(4096), remaining)
+            except asyncio.TimeoutError as msg:
+                if self._writer.is_closing():  # The connection failed, e.g. keepalive found the gateway gone
+                    self.__connection_lost(msg)
+                break
+            except OSError as msg:
+                self.__connection_lost(msg)
+                break
+            if not data:
+                self.__connection_lost("Connection closed by the gateway")
+                break
+
+    async def __get_response_messages(self, resp_msg_signatures, timeout):
+        """ Read from the gateway for up to timeout, stopping early once all of the response signatures are found.
+        Returns a dict mapping each signature found to its matching message """
+
+        matching_messages = {}
+        pending = set(resp_msg_signatures)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # Read a whole message at a time, up to and including its end of message byte
+                message = await asyncio.wait_for(self._reader.readuntil(b'\xf7'), remaining)
+            except asyncio.TimeoutError as msg:
+                if self._writer.is_closing():  # The connection failed, e.g. keepalive found the gateway gone
+                    self.__connection_lost(msg)
+                break
+            except asyncio.IncompleteReadError:
+                self.__connection_lost("Connection closed by the gateway")
+                break
+            except OSError as msg:
+                self.__connection_lost(msg)
+                break
+            if pending:
+                found, _ = _find_signatures(message, pending)
+                matching_messages.update(found)
+                pending.difference_update(found)
+                if not pending:
+                    break
+        if pending:
+            self._pending_response = True  # Discard a response arriving after the timeout, see Russound
+        return matching_messages
@@ -6,8 +6,6 @@ import time
 
 IP_ADDRESS = '192.168.1.72'
 PORT = 9001
-logging.basicConfig(filename='russound_debugging.log', level=logging.DEBUG,
-                    format='%(asctime)s:%(name)s:%(levelname)s:%(funcName)s():%(message)s')
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -110,5 +108,9 @@ def test4():
     _LOGGER.debug("Zone %s source=%s", zone, x.get_source('1',zone))
 
 
-#Run test 4...
-test4()
\ No newline at end of file
+if __name__ == '__main__':
+    # Only configure logging and talk to the controller when run as a script, not when imported
+    logging.basicConfig(filename='russound_debugging.log', level=logging.DEBUG,
+                        format='%(asctime)s:%(name)s:%(levelname)s:%(funcName)s():%(message)s')
+    #Run test 4...
+    test4()